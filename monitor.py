@@ -5,18 +5,162 @@ Continuously monitors ping latency and saves results to a file.
 Press Ctrl+C to stop monitoring and save results.
 """
 
+import asyncio
 import subprocess
 import time
 import json
-import signal
+import math
+import socket
 import sys
+import os
 from datetime import datetime
 import re
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import compress
+
+try:
+    # icmplib sends ICMP echo requests directly, avoiding a ping process per probe
+    from icmplib import async_ping as icmp_ping
+    from icmplib import resolve as icmp_resolve
+    from icmplib import ICMPLibError
+except ImportError:
+    icmp_ping = None
+
+try:
+    # orjson serializes in C, several times faster than the json module
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps(obj, pretty=False):
+    """Serialize obj to a JSON string, compact unless pretty"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0).decode()
+    if pretty:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(",", ":"))
+
+_loads = orjson.loads if orjson else json.loads
+
+# Latency in raw ping output.
+# macOS/Linux: "time=12.345 ms" | Windows: "time=12ms" or "time<1ms"
+_LATENCY_RE = re.compile(rb'time[=<]([0-9.]+)')
+
+class P2Quantile:
+    """Streaming quantile estimate in constant memory (P² algorithm, Jain & Chlamtac 1985)"""
+    
+    def __init__(self, p):
+        self.p = p
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+    
+    def add(self, x):
+        """Update the five markers with a new observation"""
+        q = self._heights
+        if len(q) < 5:
+            insort(q, x)
+            return
+        
+        # Find the cell containing x, extending the extreme markers if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+        
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+    
+    def _parabolic(self, i, d):
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+    
+    def value(self):
+        """Current estimate (exact while fewer than five samples have been seen)"""
+        q = self._heights
+        if not q:
+            return None
+        if len(q) < 5:
+            return q[min(int(self.p * len(q)), len(q) - 1)]
+        return q[2]
+
+class RunningStats:
+    """Latency statistics updated per sample: Welford mean/variance, min/max and P² percentiles"""
+    
+    def __init__(self, percentiles=(50, 95, 99)):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.percentiles = {p: P2Quantile(p / 100) for p in percentiles}
+    
+    def add(self, x):
+        """Add one latency sample"""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        for estimator in self.percentiles.values():
+            estimator.add(x)
+    
+    @property
+    def std_dev(self):
+        """Population standard deviation"""
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+    
+    def percentile(self, p):
+        return self.percentiles[p].value()
 
 class PingMonitor:
-    def __init__(self, target="1.1.1.1", interval=1, output_file=None):
+    # How often the raw results log is flushed and synced to disk
+    RAW_FLUSH_SECONDS = 60
+    # Smallest MAD the rolling spike detector uses, in ms (Windows ping reports whole ms)
+    SPIKE_MIN_MAD_MS = 1.0
+    # Longest a single probe may take before it counts as a timeout
+    PROBE_TIMEOUT_SECONDS = 5
+    # Hard limit on concurrent probes (each may be a ping process), however short the interval
+    MAX_PROBES_IN_FLIGHT = 100
+    
+    def __init__(self, target="1.1.1.1", interval=1, output_file=None, keep_raw=True,
+                 spike_window=5, spike_mult=5.3, quiet=False):
+        if interval <= 0:
+            raise ValueError(f"interval must be positive, got {interval}")
+        if spike_window < 0:
+            raise ValueError(f"spike_window must not be negative, got {spike_window}")
         self.target = target
         self.interval = interval
+        self.keep_raw = keep_raw
+        self.quiet = quiet
+        self.spike_window = spike_window
+        self.spike_mult = spike_mult
         self.start_time = datetime.now()
         
         # Generate filename with datetime if not provided
@@ -25,24 +169,54 @@ class PingMonitor:
             self.output_file = f"ping_results_{timestamp}.json"
         else:
             self.output_file = output_file
-            
-        self.results = []
+        self.summary_file = os.path.splitext(self.output_file)[0] + ".summary.json"
+        
+        # Raw results are streamed to an NDJSON log next to the output file rather
+        # than held in memory, so a killed monitor still leaves its data behind
+        base = os.path.splitext(self.output_file)[0]
+        self.raw_file = base + ".jsonl"
+        self._raw = None
+        if keep_raw:
+            # Never truncate an existing log, it may hold the data of a killed run;
+            # log to the next free name instead
+            suffix = 0
+            while self._raw is None:
+                try:
+                    self._raw = open(self.raw_file, "x")
+                except FileExistsError:
+                    suffix += 1
+                    self.raw_file = f"{base}.{suffix}.jsonl"
+            if suffix:
+                print(f"⚠️  {base}.jsonl already exists (left by an earlier run?); logging to {self.raw_file}")
+        self._last_flush = time.monotonic()
+        
+        # Latencies for the summary, one per ping with NaN marking a timeout.
+        # A float array costs 8 bytes per ping against ~240 for a result dict.
+        self._latencies = array('d') if keep_raw else None
+        # Parallel success flags (1 byte per ping) so successes are selected in C
+        self._ok = array('B') if keep_raw else None
+        
+        self.ping_count = 0
+        # Streaming percentile estimates are only needed when no raw samples are
+        # kept to compute exact ones from
+        self.stats = RunningStats(percentiles=() if keep_raw else (50, 95, 99))
         self.running = True
         
-        # Set up signal handler for graceful shutdown
-        signal.signal(signal.SIGINT, self.signal_handler)
+        # Probe once whether ICMP sockets are usable; otherwise fall back to the ping binary
+        self._privileged = hasattr(os, "geteuid") and os.geteuid() == 0
+        self._icmp_available = icmp_ping is not None and self._probe_icmp_socket()
         
-    def signal_handler(self, sig, frame):
-        """Handle Ctrl+C gracefully"""
-        print(f"\n\nStopping monitor... Saving {len(self.results)} results to {self.output_file}")
-        self.running = False
-        self.save_results()
-        sys.exit(0)
-    
-    def ping_once(self):
-        """Execute a single ping and return latency in ms"""
+        # icmplib looks hostnames up again on every ping, so resolve the target once
+        self._address = self.target
+        if self._icmp_available:
+            try:
+                self._address = icmp_resolve(self.target)[0]
+            except ICMPLibError:
+                print(f"⚠️  Could not resolve {self.target}; retrying on every ping")
+        
+        # The fallback ping command is the same for every probe, so build it once
         is_windows = sys.platform.startswith('win')
-
+        
         # Platform-specific ping command arguments
         count_param = "-n" if is_windows else "-c"
         # -W is timeout in ms on macOS, -w is timeout in ms on Windows.
@@ -50,147 +224,345 @@ class PingMonitor:
         # so we assume the timeout value is in milliseconds.
         timeout_param = "-w" if is_windows else "-W"
         
-        command = ["ping", count_param, "1", timeout_param, "2000", self.target]
+        self._command = ["ping", count_param, "1", timeout_param, "2000", self.target]
+        
+        # Output stays as bytes; decoding it is unnecessary for the regex
+        self._process_kwargs = {'stdout': subprocess.PIPE, 'stderr': subprocess.DEVNULL}
+        if is_windows:
+            # 0x08000000 is subprocess.CREATE_NO_WINDOW.
+            # This flag prevents the console window from popping up on Windows.
+            self._process_kwargs['creationflags'] = 0x08000000
+        
+        # Starting ping.exe costs tens of milliseconds on Windows, so at the default
+        # 1 second interval a single `ping -t` is kept running and its replies are
+        # read as they arrive. Its cadence is fixed at one second, hence the check.
+        self._ping_stream = is_windows and not self._icmp_available and self.interval == 1
+        self._consecutive_failures = 0
+        
+    def stop(self):
+        """Stop monitoring and save the collected results"""
+        print(f"\n\nStopping monitor... Saving {self.ping_count} results to {self.output_file}")
+        self.running = False
+        self.save_results()
+    
+    def _probe_icmp_socket(self):
+        """Check for raw ICMP sockets, or unprivileged datagram ICMP on Linux/macOS"""
+        for sock_type, privileged in ((socket.SOCK_RAW, True), (socket.SOCK_DGRAM, False)):
+            try:
+                socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP).close()
+            except OSError:
+                continue
+            self._privileged = privileged
+            return True
+        return False
+    
+    async def ping_once(self):
+        """Execute a single ping and return latency in ms"""
+        if self._icmp_available:
+            try:
+                host = await icmp_ping(self._address, count=1, timeout=2, privileged=self._privileged)
+            except ICMPLibError:
+                return None
+            return host.avg_rtt if host.packets_received else None
         
         try:
-            kwargs = {'capture_output': True, 'text': True, 'timeout': 5}
-            if is_windows:
-                # 0x08000000 is subprocess.CREATE_NO_WINDOW.
-                # This flag prevents the console window from popping up on Windows.
-                kwargs['creationflags'] = 0x08000000
-
-            result = subprocess.run(command, **kwargs)
-            
-            if result.returncode == 0:
-                # Parse ping output for latency
-                # macOS/Linux: "time=12.345 ms" | Windows: "time=12ms" or "time<1ms"
-                match = re.search(r'time[=<]([0-9\.]+)', result.stdout)
-                if match:
-                    return float(match.group(1))
-            
+            process = await asyncio.create_subprocess_exec(*self._command, **self._process_kwargs)
+        except OSError:
             return None
-            
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
+        
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.PROBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
             return None
+        
+        if process.returncode == 0:
+            # Parse ping output for latency
+            match = _LATENCY_RE.search(stdout)
+            if match:
+                return float(match.group(1))
+        
+        return None
     
-    def monitor(self):
+    async def monitor(self):
         """Main monitoring loop"""
         print(f"Starting ping monitoring to {self.target}")
         print(f"Interval: {self.interval} seconds")
+        if self._icmp_available:
+            print("Probe method: ICMP socket")
+        else:
+            print(f"Probe method: {'continuous ping command' if self._ping_stream else 'ping command'}")
         print(f"Output file: {self.output_file}")
         print("Press Ctrl+C to stop and save results\n")
         
-        consecutive_failures = 0
+        if self._ping_stream:
+            await self._monitor_ping_stream()
+            if not self.running:
+                return
+            # ping -t could not start or exited (e.g. an unknown host); keep
+            # monitoring with a ping command per probe instead
+            print(f"⚠️  Continuous ping for {self.target} stopped; falling back to one ping command per probe")
+            self._ping_stream = False
+        
+        # Each tick starts a probe without waiting for it, so a slow ping never
+        # delays the next one; a separate task records results in tick order
+        pending = asyncio.Queue()
+        recorder = asyncio.create_task(self._record_in_order(pending))
+        
+        # At most as many probes in flight as can start within one probe timeout
+        # (up to MAX_PROBES_IN_FLIGHT); when they are all outstanding the loop
+        # waits and the schedule restarts
+        limit = min(math.ceil(self.PROBE_TIMEOUT_SECONDS / self.interval), self.MAX_PROBES_IN_FLIGHT)
+        in_flight = asyncio.Semaphore(max(1, limit))
+        
+        # Ticks are scheduled against a monotonic deadline so the time spent
+        # pinging does not stretch the interval
+        next_tick = time.monotonic()
+        
+        try:
+            while self.running:
+                # If recording failed, re-raise here to stop monitoring instead of
+                # queueing probes that are never recorded
+                if recorder.done():
+                    recorder.result()
+                
+                await in_flight.acquire()
+                timestamp = time.time()
+                probe = asyncio.create_task(self.ping_once())
+                probe.add_done_callback(lambda _: in_flight.release())
+                pending.put_nowait((timestamp, probe))
+                
+                next_tick += self.interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    # Fell behind (e.g. a stalled loop); restart the schedule rather than burst
+                    next_tick = time.monotonic()
+                    await asyncio.sleep(0)
+        finally:
+            recorder.cancel()
+    
+    async def _record_in_order(self, pending):
+        """Record probes as they complete, in the order they were started"""
+        while True:
+            timestamp, probe = await pending.get()
+            try:
+                latency = await probe
+            except Exception as e:
+                # An unexpected probe error counts as a failed ping
+                print(f"⚠️  Ping to {self.target} failed: {e}")
+                latency = None
+            self._report(timestamp, latency)
+    
+    async def _monitor_ping_stream(self):
+        """Record the replies of one long-running `ping -t` (Windows) as they arrive
+        
+        Returns if ping cannot be started or exits while monitoring is running.
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ping", "-t", "-w", "2000", self.target, **self._process_kwargs)
+        except OSError as e:
+            print(f"❌ Could not start ping: {e}")
+            return
         
-        while self.running:
-            timestamp = datetime.now().isoformat()
-            latency = self.ping_once()
+        try:
+            # Skip the blank line and the "Pinging <target> ..." banner
+            line = b"\n"
+            while line and not line.strip():
+                line = await process.stdout.readline()
             
-            if latency is not None:
-                self.results.append({
-                    "timestamp": timestamp,
-                    "target": self.target,
-                    "latency_ms": latency,
-                    "status": "success"
-                })
-                print(f"{timestamp}: {self.target} - {latency:.2f}ms")
-                consecutive_failures = 0
-            else:
-                self.results.append({
-                    "timestamp": timestamp,
-                    "target": self.target,
-                    "latency_ms": None,
-                    "status": "timeout"
-                })
-                consecutive_failures += 1
-                print(f"{timestamp}: {self.target} - TIMEOUT")
+            while self.running:
+                line = await process.stdout.readline()
+                if not line:
+                    print(f"⚠️  ping for {self.target} exited")
+                    break
+                line = line.strip()
+                if not line:
+                    continue
                 
-                # Warning if too many consecutive failures
-                if consecutive_failures >= 5:
-                    print(f"⚠️  Warning: {consecutive_failures} consecutive timeouts")
+                # Anything other than a reply with a time is a failed probe
+                # (request timed out, host unreachable, general failure)
+                match = _LATENCY_RE.search(line)
+                self._report(time.time(), float(match.group(1)) if match else None)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+    
+    def _report(self, timestamp, latency):
+        """Record a result and print it"""
+        self.record(timestamp, latency)
+        
+        if latency is not None:
+            if not self.quiet:
+                print(f"{datetime.fromtimestamp(timestamp).isoformat()}: {self.target} - {latency:.2f}ms")
+            self._consecutive_failures = 0
+        else:
+            self._consecutive_failures += 1
+            if not self.quiet:
+                print(f"{datetime.fromtimestamp(timestamp).isoformat()}: {self.target} - TIMEOUT")
             
-            time.sleep(self.interval)
+            # Warning if too many consecutive failures
+            if self._consecutive_failures >= 5:
+                print(f"⚠️  Warning: {self._consecutive_failures} consecutive timeouts to {self.target}")
+    
+    def record(self, timestamp, latency):
+        """Record one ping result (timestamp from time.time(), latency is None on timeout)"""
+        self.ping_count += 1
+        if latency is not None:
+            self.stats.add(latency)
+        
+        if self._latencies is not None:
+            self._latencies.append(latency if latency is not None else math.nan)
+            self._ok.append(latency is not None)
+        
+        if self._raw is not None:
+            # The log keeps the raw epoch time; ISO strings are only rendered on save
+            result = {
+                "t": timestamp,
+                "target": self.target,
+                "latency_ms": latency,
+                "status": "success" if latency is not None else "timeout"
+            }
+            self._raw.write(_dumps(result) + "\n")
+            
+            now = time.monotonic()
+            if now - self._last_flush >= self.RAW_FLUSH_SECONDS:
+                self._raw.flush()
+                os.fsync(self._raw.fileno())
+                self._last_flush = now
+    
+    def read_raw_results(self):
+        """Yield the recorded results back from the raw NDJSON log, with ISO timestamps"""
+        with open(self.raw_file) as f:
+            for line in f:
+                result = _loads(line)
+                yield {
+                    "timestamp": datetime.fromtimestamp(result["t"]).isoformat(),
+                    "target": result["target"],
+                    "latency_ms": result["latency_ms"],
+                    "status": result["status"]
+                }
     
     def save_results(self):
         """Save results to JSON file"""
-        if not self.results:
+        if not self.ping_count:
             print("No results to save.")
+            if self._raw is not None:
+                self._raw.close()
+                os.remove(self.raw_file)
             return
         
-        # Calculate summary statistics
-        successful_pings = [r for r in self.results if r["status"] == "success"]
-        latencies = [r["latency_ms"] for r in successful_pings]
+        if self._raw is not None:
+            self._raw.close()
         
+        # Counts, mean, deviation and min/max are maintained while monitoring
+        stats = self.stats
         summary = {
             "monitoring_started": self.start_time.isoformat(),
             "monitoring_ended": datetime.now().isoformat(),
-            "total_pings": len(self.results),
-            "successful_pings": len(successful_pings),
-            "failed_pings": len(self.results) - len(successful_pings),
-            "success_rate": len(successful_pings) / len(self.results) * 100 if self.results else 0,
+            "total_pings": self.ping_count,
+            "successful_pings": stats.count,
+            "failed_pings": self.ping_count - stats.count,
+            "success_rate": stats.count / self.ping_count * 100,
             "target": self.target,
             "interval_seconds": self.interval
         }
         
-        if latencies:
-            sorted_latencies = sorted(latencies)
-            n = len(latencies)
-            
-            # Basic statistics
-            avg_latency = sum(latencies) / n
-            median_latency = sorted_latencies[n//2] if n % 2 == 1 else (sorted_latencies[n//2-1] + sorted_latencies[n//2]) / 2
-            
-            # Percentile calculations
-            p95_latency = sorted_latencies[int(0.95 * n)] if n > 0 else 0
-            p99_latency = sorted_latencies[int(0.99 * n)] if n > 0 else 0
-            
-            # Standard deviation
-            variance = sum((x - avg_latency) ** 2 for x in latencies) / n
-            std_dev = variance ** 0.5
+        if stats.count:
+            avg_latency = stats.mean
+            std_dev = stats.std_dev
             
-            # Spike detection using multiple methods
-            spike_stats = self.calculate_spike_statistics(latencies, avg_latency, median_latency, std_dev)
+            if self.keep_raw:
+                # Exact percentiles and spike analysis from the raw samples.
+                # One sort serves every order statistic (median, percentiles,
+                # quartiles). A selection in pure Python is slower than the C sort.
+                latencies = list(compress(self._latencies, self._ok))
+                sorted_latencies = sorted(latencies)
+                n = len(latencies)
+                
+                median_latency = sorted_latencies[n//2] if n % 2 == 1 else (sorted_latencies[n//2-1] + sorted_latencies[n//2]) / 2
+                p95_latency = sorted_latencies[int(0.95 * n)]
+                p99_latency = sorted_latencies[int(0.99 * n)]
+            else:
+                # Streaming estimates; no raw samples to rescan
+                median_latency = stats.percentile(50)
+                p95_latency = stats.percentile(95)
+                p99_latency = stats.percentile(99)
             
             summary.update({
                 "avg_latency_ms": avg_latency,
                 "median_latency_ms": median_latency,
-                "min_latency_ms": min(latencies),
-                "max_latency_ms": max(latencies),
+                "min_latency_ms": stats.min,
+                "max_latency_ms": stats.max,
                 "std_dev_ms": std_dev,
                 "p95_latency_ms": p95_latency,
-                "p99_latency_ms": p99_latency,
-                "spike_analysis": spike_stats
+                "p99_latency_ms": p99_latency
             })
+            
+            if self.keep_raw:
+                # Spike detection using multiple methods (reuses the sorted copy)
+                spike_stats = self.calculate_spike_statistics(
+                    latencies, avg_latency, median_latency, std_dev, sorted_latencies)
+                
+                # Rolling median/MAD spikes, reported by their index in results
+                rolling_spikes = self.detect_rolling_spikes(latencies)
+                if rolling_spikes:
+                    success_indices = list(compress(range(len(self._ok)), self._ok))
+                    rolling_spikes = [(success_indices[i], x) for i, x in rolling_spikes]
+                spike_stats["rolling_median"] = {
+                    "window": 2 * self.spike_window + 1,
+                    "multiplier": self.spike_mult,
+                    "min_mad_ms": self.SPIKE_MIN_MAD_MS,
+                    "count": len(rolling_spikes),
+                    "percentage": (len(rolling_spikes) / n) * 100,
+                    "spikes": [{"index": i, "latency_ms": x} for i, x in rolling_spikes]
+                }
+                summary["spike_analysis"] = spike_stats
         
-        # Save to file
-        output_data = {
-            "summary": summary,
-            "results": self.results
-        }
-        
+        # Save to file. The results file is machine-read, so it is written compactly,
+        # streaming the results from the raw log; the summary also goes to a small
+        # pretty-printed file of its own.
         try:
             with open(self.output_file, 'w') as f:
-                json.dump(output_data, f, indent=2)
-            print(f"✅ Results saved to {self.output_file}")
+                f.write('{"summary":' + _dumps(summary) + ',"results":[')
+                if self._raw is not None:
+                    for i, result in enumerate(self.read_raw_results()):
+                        if i:
+                            f.write(",")
+                        f.write(_dumps(result))
+                f.write("]}")
+            with open(self.summary_file, 'w') as f:
+                f.write(_dumps(summary, pretty=True) + "\n")
+            print(f"✅ Results saved to {self.output_file} (summary: {self.summary_file})")
+            
+            # Everything in the raw log is now part of the output file
+            if self._raw is not None:
+                os.remove(self.raw_file)
             
             # Print summary
             print(f"\n📊 Summary:")
             print(f"   Total pings: {summary['total_pings']}")
             print(f"   Success rate: {summary['success_rate']:.1f}%")
-            if latencies:
+            if stats.count:
                 print(f"   Average latency: {summary['avg_latency_ms']:.2f}ms")
                 print(f"   Median latency: {summary['median_latency_ms']:.2f}ms")
                 print(f"   Min/Max latency: {summary['min_latency_ms']:.2f}ms / {summary['max_latency_ms']:.2f}ms")
                 print(f"   95th percentile: {summary['p95_latency_ms']:.2f}ms")
                 print(f"   99th percentile: {summary['p99_latency_ms']:.2f}ms")
                 print(f"   Standard deviation: {summary['std_dev_ms']:.2f}ms")
-                
+            
+            if "spike_analysis" in summary:
                 # Spike summary
                 spike_stats = summary['spike_analysis']
                 print(f"\n🔥 Spike Analysis:")
                 print(f"   Spikes > 100ms: {spike_stats['spikes_above_100ms']['count']} ({spike_stats['spikes_above_100ms']['percentage']:.1f}%)")
                 print(f"   Spikes > 200ms: {spike_stats['spikes_above_200ms']['count']} ({spike_stats['spikes_above_200ms']['percentage']:.1f}%)")
                 print(f"   Statistical outliers (2σ): {spike_stats['statistical_outliers']['two_std_dev']['count']} ({spike_stats['statistical_outliers']['two_std_dev']['percentage']:.1f}%)")
+                print(f"   Rolling median spikes: {spike_stats['rolling_median']['count']} ({spike_stats['rolling_median']['percentage']:.1f}%)")
                 
                 # Video conferencing quality
                 quality = spike_stats['video_conferencing_quality']
@@ -204,114 +576,198 @@ class PingMonitor:
         except IOError as e:
             print(f"❌ Error saving results: {e}")
     
-    def calculate_spike_statistics(self, latencies, avg_latency, median_latency, std_dev):
-        """Calculate comprehensive spike statistics"""
-        spike_stats = {}
+    def calculate_spike_statistics(self, latencies, avg_latency, median_latency, std_dev, sorted_latencies=None):
+        """Calculate comprehensive spike statistics
+        
+        latencies must be in chronological order; pass sorted_latencies if the
+        caller already sorted them to avoid sorting a second time.
+        """
+        if sorted_latencies is None:
+            sorted_latencies = sorted(latencies)
+        n = len(latencies)
         
         # Method 1: Fixed thresholds (good for video conferencing)
         thresholds = [50, 100, 150, 200, 300, 500]
-        for threshold in thresholds:
-            spikes = [x for x in latencies if x > threshold]
-            spike_stats[f"spikes_above_{threshold}ms"] = {
-                "count": len(spikes),
-                "percentage": (len(spikes) / len(latencies)) * 100,
-                "values": spikes if len(spikes) <= 10 else spikes[-10:]  # Last 10 spikes if too many
-            }
         
-        # Method 2: Statistical outliers (2 standard deviations)
+        # Method 2/3: Statistical outliers (2 and 3 standard deviations)
         outlier_threshold_2sd = avg_latency + (2 * std_dev)
-        outliers_2sd = [x for x in latencies if x > outlier_threshold_2sd]
-        
-        # Method 3: Statistical outliers (3 standard deviations)
         outlier_threshold_3sd = avg_latency + (3 * std_dev)
-        outliers_3sd = [x for x in latencies if x > outlier_threshold_3sd]
         
         # Method 4: IQR method (Interquartile Range)
-        sorted_latencies = sorted(latencies)
-        n = len(latencies)
         q1 = sorted_latencies[n//4]
         q3 = sorted_latencies[3*n//4]
         iqr = q3 - q1
         iqr_threshold = q3 + (1.5 * iqr)
-        iqr_outliers = [x for x in latencies if x > iqr_threshold]
         
         # Method 5: Median-based spike detection
         median_threshold = median_latency * 3  # 3x median
-        median_spikes = [x for x in latencies if x > median_threshold]
         
-        # Add statistical methods to results
-        spike_stats.update({
-            "statistical_outliers": {
-                "two_std_dev": {
-                    "threshold_ms": outlier_threshold_2sd,
-                    "count": len(outliers_2sd),
-                    "percentage": (len(outliers_2sd) / len(latencies)) * 100,
-                    "values": outliers_2sd if len(outliers_2sd) <= 10 else outliers_2sd[-10:]
-                },
-                "three_std_dev": {
-                    "threshold_ms": outlier_threshold_3sd,
-                    "count": len(outliers_3sd),
-                    "percentage": (len(outliers_3sd) / len(latencies)) * 100,
-                    "values": outliers_3sd if len(outliers_3sd) <= 10 else outliers_3sd[-10:]
-                },
-                "iqr_method": {
-                    "threshold_ms": iqr_threshold,
-                    "count": len(iqr_outliers),
-                    "percentage": (len(iqr_outliers) / len(latencies)) * 100,
-                    "values": iqr_outliers if len(iqr_outliers) <= 10 else iqr_outliers[-10:]
-                },
-                "median_3x": {
-                    "threshold_ms": median_threshold,
-                    "count": len(median_spikes),
-                    "percentage": (len(median_spikes) / len(latencies)) * 100,
-                    "values": median_spikes if len(median_spikes) <= 10 else median_spikes[-10:]
-                }
+        limits = thresholds + [outlier_threshold_2sd, outlier_threshold_3sd, iqr_threshold, median_threshold]
+        
+        # Counts come straight from the sorted latencies: everything after the
+        # bisect position of a limit is above it
+        counts = [n - bisect_right(sorted_latencies, limit) for limit in limits]
+        
+        # Quality buckets for video conferencing: <=20, <=50, <=100, <=200, >200
+        cumulative = [bisect_right(sorted_latencies, edge) for edge in (20, 50, 100, 200)] + [n]
+        quality_counts = [cumulative[0]] + [b - a for a, b in zip(cumulative, cumulative[1:])]
+        
+        # Last 10 spikes per limit, in chronological order. Walk back from the newest
+        # latency only until each limit has them all; with the limits in ascending
+        # order a latency exceeds exactly a prefix of them, found by bisect.
+        order = sorted(range(len(limits)), key=limits.__getitem__)
+        ordered_limits = [limits[i] for i in order]
+        wanted = [min(count, 10) for count in counts]
+        recent = [[] for _ in limits]
+        remaining = sum(wanted)
+        for x in reversed(latencies):
+            if not remaining:
+                break
+            for i in order[:bisect_left(ordered_limits, x)]:
+                if len(recent[i]) < wanted[i]:
+                    recent[i].append(x)
+                    remaining -= 1
+        
+        def spike_entry(i):
+            return {
+                "count": counts[i],
+                "percentage": (counts[i] / n) * 100,
+                "values": recent[i][::-1]
             }
-        })
         
-        # Quality assessment for video conferencing
-        excellent_count = len([x for x in latencies if x <= 20])
-        good_count = len([x for x in latencies if 20 < x <= 50])
-        acceptable_count = len([x for x in latencies if 50 < x <= 100])
-        poor_count = len([x for x in latencies if 100 < x <= 200])
-        very_poor_count = len([x for x in latencies if x > 200])
+        spike_stats = {}
+        for i, threshold in enumerate(thresholds):
+            spike_stats[f"spikes_above_{threshold}ms"] = spike_entry(i)
         
+        # Add statistical methods to results
+        first = len(thresholds)
+        spike_stats["statistical_outliers"] = {
+            name: {"threshold_ms": limits[first + j], **spike_entry(first + j)}
+            for j, name in enumerate(["two_std_dev", "three_std_dev", "iqr_method", "median_3x"])
+        }
+        
+        # Quality assessment for video conferencing
         spike_stats["video_conferencing_quality"] = {
-            "excellent_0_20ms": {"count": excellent_count, "percentage": (excellent_count / len(latencies)) * 100},
-            "good_20_50ms": {"count": good_count, "percentage": (good_count / len(latencies)) * 100},
-            "acceptable_50_100ms": {"count": acceptable_count, "percentage": (acceptable_count / len(latencies)) * 100},
-            "poor_100_200ms": {"count": poor_count, "percentage": (poor_count / len(latencies)) * 100},
-            "very_poor_above_200ms": {"count": very_poor_count, "percentage": (very_poor_count / len(latencies)) * 100}
+            name: {"count": count, "percentage": (count / n) * 100}
+            for name, count in zip(["excellent_0_20ms", "good_20_50ms", "acceptable_50_100ms",
+                                    "poor_100_200ms", "very_poor_above_200ms"], quality_counts)
         }
         
         return spike_stats
+    
+    def detect_rolling_spikes(self, latencies):
+        """Find spikes against a rolling median (castr-style moving median/MAD)
+        
+        A latency is a spike when it is more than spike_mult median absolute
+        deviations away from the median of the 2k+1 samples centred on it,
+        k being spike_window. This follows drift such as a Wi-Fi roam, which
+        global thresholds report as one long spike. Returns (position, latency)
+        pairs for positions in latencies; the first and last k samples have no
+        full window and are skipped.
+        
+        On a stable link most of a window can hold the same value, making the
+        MAD zero so that any deviation at all would count. The MAD is therefore
+        floored at SPIKE_MIN_MAD_MS, e.g. with the defaults a spike must be more
+        than 5.3 ms away from the rolling median.
+        """
+        k = self.spike_window
+        size = 2 * k + 1
+        if len(latencies) < size:
+            return []
+        
+        # Keep the current window sorted so its median is the middle element
+        window = sorted(latencies[:size])
+        spikes = []
+        for i in range(k, len(latencies) - k):
+            if i > k:
+                del window[bisect_left(window, latencies[i - k - 1])]
+                insort(window, latencies[i + k])
+            median = window[k]
+            mad = max(sorted(abs(x - median) for x in window)[k], self.SPIKE_MIN_MAD_MS)
+            if abs(latencies[i] - median) > self.spike_mult * mad:
+                spikes.append((i, latencies[i]))
+        return spikes
 
 def main():
     """Main function with command line argument parsing"""
     import argparse
     
+    def positive_float(value):
+        number = float(value)
+        if number <= 0:
+            raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+        return number
+    
+    def non_negative_int(value):
+        number = int(value)
+        if number < 0:
+            raise argparse.ArgumentTypeError(f"must not be negative, got {value}")
+        return number
+    
     parser = argparse.ArgumentParser(description="Monitor ping latency.")
-    parser.add_argument("--target", "-t", default="1.1.1.1", 
-                       help="Target IP address or hostname (default: 1.1.1.1)")
-    parser.add_argument("--interval", "-i", type=float, default=1.0,
+    parser.add_argument("--target", "--targets", "-t", default="1.1.1.1",
+                       help="Target IP address or hostname; separate several with commas (default: 1.1.1.1)")
+    parser.add_argument("--interval", "-i", type=positive_float, default=1.0,
                        help="Ping interval in seconds (default: 1.0)")
     parser.add_argument("--output", "-o", default=None,
                        help="Output file name (default: ping_results_YYYY-MM-DD-HH.MM.json)")
+    parser.add_argument("--no-raw", dest="keep_raw", action="store_false",
+                       help="Keep only running statistics, without the per-ping results log")
+    parser.add_argument("--quiet", "-q", action="store_true",
+                       help="Do not print a line for every ping")
+    parser.add_argument("--spike-window", type=non_negative_int, default=5,
+                       help="Half-width k of the rolling median spike window of 2k+1 pings (default: 5)")
+    parser.add_argument("--spike-mult", type=float, default=5.3,
+                       help="Rolling spike threshold in median absolute deviations (default: 5.3)")
     
     args = parser.parse_args()
+    targets = [target.strip() for target in args.target.split(",") if target.strip()]
+    
+    # With several targets each one gets its own output file, named after the target
+    if len(targets) > 1:
+        base, ext = os.path.splitext(args.output or f"ping_results_{datetime.now():%Y-%m-%d-%H.%M}.json")
+        outputs = [f"{base}_{target.replace(':', '-')}{ext}" for target in targets]
+    else:
+        outputs = [args.output]
+    
+    # Create and start monitors; all targets are pinged concurrently on one event loop
+    monitors = [
+        PingMonitor(
+            target=target,
+            interval=args.interval,
+            output_file=output,
+            keep_raw=args.keep_raw,
+            spike_window=args.spike_window,
+            spike_mult=args.spike_mult,
+            quiet=args.quiet
+        )
+        for target, output in zip(targets, outputs)
+    ]
     
-    # Create and start monitor
-    monitor = PingMonitor(
-        target=args.target,
-        interval=args.interval,
-        output_file=args.output
-    )
+    # Per-ping lines are buffered and flushed once a second rather than on every
+    # line, so fast intervals do not block on terminal writes
+    if not args.quiet and hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=False)
+    
+    async def flush_stdout():
+        while True:
+            sys.stdout.flush()
+            await asyncio.sleep(1)
+    
+    async def run_all():
+        flusher = asyncio.create_task(flush_stdout())
+        try:
+            await asyncio.gather(*(monitor.monitor() for monitor in monitors))
+        finally:
+            flusher.cancel()
+            sys.stdout.flush()
     
     try:
-        monitor.monitor()
+        asyncio.run(run_all())
     except KeyboardInterrupt:
-        # This should be handled by signal handler, but just in case
-        monitor.save_results()
+        # Ctrl+C: stop every monitor and save what it collected
+        for monitor in monitors:
+            monitor.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file